@@ -18,7 +18,7 @@ from werkzeug.security import generate_password_hash
 from werkzeug.utils import secure_filename
 from g4f.api import run_api
 
-from config import config
+from config import get_config
 from database import db_manager
 from auth import auth_service, require_auth, require_token_auth
 from ai_service import ai_service
@@ -46,6 +46,8 @@ from utils.helpers import (
 from telegram_bot import start_telegram_bot
 from slack_bot import start_slack_bot
 
+config = get_config()
+
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = config.security.secret_key
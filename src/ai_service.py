@@ -1,13 +1,15 @@
 """AI service for handling GPT interactions."""
 
+import asyncio
 import json
 import random
 from typing import Dict, List, Any, Optional, AsyncGenerator
 from pathlib import Path
 
 import g4f
+from g4f.errors import StreamNotSupportedError
 
-from config import config
+from config import get_config
 from database import db_manager
 from utils.exceptions import AIProviderError, ValidationError
 from utils.logging import logger
@@ -15,18 +17,23 @@ from utils.http_utils import safe_api_call, TimeoutConfig
 from utils.helpers import (
     load_json_file, 
     clean_response_sources, 
+    strip_source_markers,
+    strip_reference_list,
     select_random_proxy,
     create_dummy_cookies
 )
 from utils.provider_monitor import provider_monitor, ProviderStatus
 from utils.validation import validate_provider, validate_model
 
+# Appended to a streamed reply that broke off after text was already sent
+STREAM_INTERRUPTED_NOTICE = "(Response interrupted. Please try again.)"
+
 class AIService:
     """Service for handling AI interactions."""
     
     def __init__(self):
         self.db = db_manager
-        self.config = config
+        self.config = get_config()
     
     async def generate_response(
         self,
@@ -61,37 +68,13 @@ class AIService:
             ValidationError: If parameters are invalid
         """
         try:
-            # Get user settings
-            if username == "admin":
-                settings = self.db.get_settings()
-                user_settings = {
-                    "provider": provider or settings.get("provider", self.config.api.default_provider),
-                    "model": model or settings.get("model", self.config.api.default_model),
-                    "system_prompt": system_prompt or settings.get("system_prompt", ""),
-                    "message_history": use_history and settings.get("message_history", False)
-                }
-            else:
-                user_data = self.db.get_user_by_username(username)
-                if not user_data:
-                    raise ValidationError(f"User '{username}' not found")
-                
-                user_settings = {
-                    "provider": provider or user_data.get("provider", self.config.api.default_provider),
-                    "model": model or user_data.get("model", self.config.api.default_model),
-                    "system_prompt": system_prompt or user_data.get("system_prompt", ""),
-                    "message_history": use_history and user_data.get("message_history", False)
-                }
-            
-            # Validate provider and model
-            is_valid_provider, provider_error = validate_provider(user_settings["provider"], self.config.available_providers)
-            if not is_valid_provider:
-                logger.warning(f"{provider_error}. Fallback to Auto.")
-                user_settings["provider"] = "Auto"
-            
-            is_valid_model, model_error = validate_model(user_settings["model"])
-            if not is_valid_model:
-                logger.warning(f"{model_error}. Fallback to default model.")
-                user_settings["model"] = self.config.api.default_model
+            user_settings = self._resolve_user_settings(
+                username=username,
+                provider=provider,
+                model=model,
+                system_prompt=system_prompt,
+                use_history=use_history
+            )
             
             # Prepare chat history
             chat_history = self._prepare_chat_history(
@@ -134,6 +117,210 @@ class AIService:
             logger.error(f"Failed to generate AI response: {e}")
             raise AIProviderError(f"AI generation failed: {e}")
     
+    async def stream_response(
+        self,
+        message: str,
+        username: str = "admin",
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        system_prompt: Optional[str] = None,
+        use_history: bool = False,
+        remove_sources: bool = True,
+        use_proxies: bool = False,
+        cookie_file: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        """Generate AI response as it is produced.
+        
+        Text is yielded in whole paragraphs (the last one may be partial).
+        If the provider fails before producing any text, the full fallback
+        chain of generate_response is used and its reply is yielded at once.
+        
+        Args:
+            message: User message
+            username: Username for context
+            provider: AI provider override
+            model: AI model override
+            system_prompt: System prompt override
+            use_history: Whether to use chat history
+            remove_sources: Whether to remove source references
+            use_proxies: Whether to use proxies
+            cookie_file: Cookie file path
+            
+        Yields:
+            AI response text segments
+            
+        Raises:
+            AIProviderError: If AI generation fails
+            ValidationError: If parameters are invalid
+        """
+        try:
+            user_settings = self._resolve_user_settings(
+                username=username,
+                provider=provider,
+                model=model,
+                system_prompt=system_prompt,
+                use_history=use_history
+            )
+            chat_history = self._prepare_chat_history(
+                message=message,
+                username=username,
+                system_prompt=user_settings["system_prompt"],
+                use_history=user_settings["message_history"]
+            )
+            cookies = self._load_cookies(cookie_file)
+            proxy = self._get_proxy() if use_proxies else None
+        except (ValidationError, AIProviderError):
+            raise
+        except Exception as e:
+            logger.error(f"Failed to generate AI response: {e}")
+            raise AIProviderError(f"AI generation failed: {e}")
+        
+        # Stream from the preferred provider unless it is known to be failing
+        provider_name = user_settings["provider"]
+        if self._should_skip_provider(provider_name):
+            logger.info(f"Not streaming from provider {provider_name} due to its status; using Auto")
+            provider_name = "Auto"
+        ai_provider = self.config.available_providers.get(provider_name) or None
+        
+        segments: List[str] = []
+        pending = ""
+        first_segment = True
+        stream_error: Optional[Exception] = None
+        stream = self._stream_api_call(chat_history, ai_provider, user_settings["model"], cookies, proxy)
+        try:
+            async for chunk in stream:
+                pending += chunk
+                # Hand out complete paragraphs; source markers never span them
+                cut = pending.rfind("\n\n")
+                if cut != -1:
+                    segment, pending = pending[:cut + 2], pending[cut + 2:]
+                    started = bool(segment.strip())
+                    if remove_sources:
+                        segment = self._clean_stream_segment(segment, first_segment)
+                    # Leading blank lines don't count as the start of the reply
+                    first_segment = first_segment and not started
+                    if segment:
+                        segments.append(segment)
+                        yield segment
+        except Exception as e:
+            stream_error = e
+        finally:
+            await stream.aclose()
+        
+        if remove_sources and pending:
+            pending = self._clean_stream_segment(pending, first_segment)
+        if pending:
+            segments.append(pending)
+            yield pending
+        
+        if stream_error is not None:
+            # A provider that simply can't stream is not unhealthy
+            if not isinstance(stream_error, StreamNotSupportedError):
+                provider_monitor.record_failure(provider_name, "stream")
+            logger.warning(f"Streaming from provider {provider_name} failed: {stream_error}")
+            if segments:
+                # Too late to fall back; tell the user and keep the cut-off turn out of history
+                yield f"\n\n{STREAM_INTERRUPTED_NOTICE}"
+                return
+        elif segments:
+            provider_monitor.record_success(provider_name)
+        
+        if not segments:
+            # Nothing was sent yet, so the regular fallback chain is still an option
+            response_text = await self._call_ai_api(
+                chat_history=chat_history,
+                provider=user_settings["provider"],
+                model=user_settings["model"],
+                cookies=cookies,
+                proxy=proxy
+            )
+            if remove_sources:
+                response_text = clean_response_sources(response_text)
+            segments.append(response_text)
+            yield response_text
+        
+        # Save chat history if enabled
+        if user_settings["message_history"]:
+            chat_history.append({"role": "assistant", "content": "".join(segments).strip()})
+            self.db.save_chat_history(username, json.dumps(chat_history))
+        
+        logger.info(f"AI response streamed for user '{username}' using provider '{provider_name}'")
+    
+    @staticmethod
+    def _clean_stream_segment(segment: str, first: bool) -> str:
+        """Remove source references from a streamed segment.
+        
+        Matches clean_response_sources: inline markers are removed, and a
+        reference list leading the reply is dropped.
+        
+        Args:
+            segment: Streamed text segment
+            first: Whether the segment starts the reply
+            
+        Returns:
+            Cleaned segment
+        """
+        if first:
+            segment = strip_reference_list(segment.lstrip())
+        return strip_source_markers(segment)
+    
+    def _resolve_user_settings(
+        self,
+        username: str,
+        provider: Optional[str],
+        model: Optional[str],
+        system_prompt: Optional[str],
+        use_history: bool
+    ) -> Dict[str, Any]:
+        """Resolve effective provider, model and prompt settings for a user.
+        
+        Args:
+            username: Username for context
+            provider: AI provider override
+            model: AI model override
+            system_prompt: System prompt override
+            use_history: Whether to use chat history
+            
+        Returns:
+            Dictionary of effective settings
+            
+        Raises:
+            ValidationError: If the user does not exist
+        """
+        # Get user settings
+        if username == "admin":
+            settings = self.db.get_settings()
+            user_settings = {
+                "provider": provider or settings.get("provider", self.config.api.default_provider),
+                "model": model or settings.get("model", self.config.api.default_model),
+                "system_prompt": system_prompt or settings.get("system_prompt", ""),
+                "message_history": use_history and settings.get("message_history", False)
+            }
+        else:
+            user_data = self.db.get_user_by_username(username)
+            if not user_data:
+                raise ValidationError(f"User '{username}' not found")
+            
+            user_settings = {
+                "provider": provider or user_data.get("provider", self.config.api.default_provider),
+                "model": model or user_data.get("model", self.config.api.default_model),
+                "system_prompt": system_prompt or user_data.get("system_prompt", ""),
+                "message_history": use_history and user_data.get("message_history", False)
+            }
+        
+        # Validate provider and model
+        is_valid_provider, provider_error = validate_provider(user_settings["provider"], self.config.available_providers)
+        if not is_valid_provider:
+            logger.warning(f"{provider_error}. Fallback to Auto.")
+            user_settings["provider"] = "Auto"
+        
+        is_valid_model, model_error = validate_model(user_settings["model"])
+        if not is_valid_model:
+            logger.warning(f"{model_error}. Fallback to default model.")
+            user_settings["model"] = self.config.api.default_model
+        
+        return user_settings
+    
     def _prepare_chat_history(
         self,
         message: str,
@@ -216,6 +403,22 @@ class AIService:
         
         return proxy_url
     
+    def _should_skip_provider(self, provider: str) -> bool:
+        """Check whether a specific provider should be bypassed in favour of Auto.
+        
+        Args:
+            provider: Provider name
+            
+        Returns:
+            True if the provider is blacklisted, degraded/unhealthy or failing repeatedly
+        """
+        if provider == "Auto":
+            return False
+        if provider_monitor.is_provider_blacklisted(provider):
+            return True
+        health = provider_monitor.get_provider_health(provider)
+        return health.status in [ProviderStatus.DEGRADED, ProviderStatus.UNHEALTHY] or health.consecutive_failures >= 2
+    
     async def _call_ai_api(
         self,
         chat_history: List[Dict[str, str]],
@@ -249,8 +452,7 @@ class AIService:
         
         # Try original provider first (unless it's currently degraded/unhealthy)
         if provider != "Auto":
-            health = provider_monitor.get_provider_health(provider)
-            if health.status in [ProviderStatus.DEGRADED, ProviderStatus.UNHEALTHY] or health.consecutive_failures >= 2:
+            if self._should_skip_provider(provider):
                 logger.info(f"Skipping provider {provider} due to degraded/unhealthy status; trying Auto")
             else:
                 ai_provider = self.config.available_providers.get(provider)
@@ -387,7 +589,6 @@ class AIService:
             # Handle both string responses and async generators
             if hasattr(response, '__aiter__'):
                 # It's an async generator
-                import asyncio
                 try:
                     async for chunk in response:
                         response_text += str(chunk)
@@ -430,6 +631,54 @@ class AIService:
             provider_monitor.record_failure(provider_name, error_type)
             return None
     
+    async def _stream_api_call(
+        self,
+        chat_history: List[Dict[str, str]],
+        ai_provider,
+        model: str,
+        cookies: Dict[str, str],
+        proxy: Optional[str]
+    ) -> AsyncGenerator[str, None]:
+        """Stream a single API call to g4f.
+        
+        Args:
+            chat_history: Chat message history
+            ai_provider: AI provider object or None for Auto
+            model: AI model
+            cookies: Request cookies
+            proxy: Proxy URL
+            
+        Yields:
+            Response text chunks
+        """
+        request_kwargs = {
+            "model": model,
+            "messages": chat_history,
+            "cookies": cookies,
+            "proxy": proxy,
+            "stream": True,
+            # Let providers without streaming support answer in one piece
+            "ignore_stream": True
+        }
+        if ai_provider is not None:
+            request_kwargs["provider"] = ai_provider
+        
+        response = g4f.ChatCompletion.create_async(**request_kwargs)
+        if not hasattr(response, '__aiter__'):
+            # Provider answered without streaming
+            yield str(await asyncio.wait_for(response, timeout=TimeoutConfig.DEFAULT_TIMEOUT))
+            return
+        
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=TimeoutConfig.READ_TIMEOUT)
+            except StopAsyncIteration:
+                break
+            # Skip non-text events (finish reasons, usage, ...)
+            if isinstance(chunk, str) and chunk:
+                yield chunk
+    
     def get_available_models(self, provider: str) -> List[str]:
         """Get available models for a provider.
         
@@ -440,7 +689,7 @@ class AIService:
             List of available models
         """
         if provider == "Auto":
-            return self.config.generic_models
+            return list(self.config.generic_models)
         
         try:
             provider_obj = self.config.available_providers.get(provider)
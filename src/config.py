@@ -1,25 +1,65 @@
 """Configuration management for FreeGPT4 Web API."""
 
 import os
-from dataclasses import dataclass
-from typing import Dict, Any, Optional
+from dataclasses import dataclass, field, replace
+from functools import cache, lru_cache
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional
 from pathlib import Path
 
+from utils.helpers import get_file_extension
+
+try:
+    import g4f
+except ImportError as _g4f_import_error:  # pragma: no cover - depends on environment
+    # Defer import errors until providers are actually requested
+    g4f = None
+    _G4F_IMPORT_ERROR: Optional[ImportError] = _g4f_import_error
+else:
+    _G4F_IMPORT_ERROR = None
+
 # Base configuration
 BASE_DIR = Path(__file__).parent
 DATA_DIR = BASE_DIR / "data"
 TEMPLATES_DIR = BASE_DIR / "templates"
 STATIC_DIR = BASE_DIR / "static"
 
-# Ensure data directory exists
-DATA_DIR.mkdir(exist_ok=True)
+# Provider names exposed in the UI/API (filtered by what g4f actually ships)
+PROVIDER_NAMES = (
+    "ARTA", "Blackbox", "Cloudflare", "Copilot", "DeepInfra",
+    "DuckDuckGo", "LambdaChat", "PerplexityLabs", "PollinationsAI",
+    "TeachAnything", "Together", "WeWordle", "Yqcloud",
+)
+
+# Read-only provider lookup table, built once at import ("Auto" lets g4f pick)
+AVAILABLE_PROVIDERS: Optional[Mapping[str, Any]] = None
+if g4f is not None:
+    AVAILABLE_PROVIDERS = MappingProxyType({
+        "Auto": "",
+        **{
+            name: getattr(g4f.Provider, name)
+            for name in PROVIDER_NAMES
+            if hasattr(g4f.Provider, name)
+        }
+    })
+
+# Models usable with the "Auto" provider
+GENERIC_MODELS = ("gpt-4", "gpt-4o", "gpt-4o-mini")
 
-@dataclass
+@cache
+def _ensure_data_dir() -> None:
+    """Create the data directory once, on first use rather than at import."""
+    DATA_DIR.mkdir(exist_ok=True)
+
+@dataclass(slots=True, frozen=True)
 class DatabaseConfig:
     """Database configuration."""
     settings_file: str = str(DATA_DIR / "settings.db")
     
-@dataclass
+    def __post_init__(self):
+        _ensure_data_dir()
+    
+@dataclass(slots=True, frozen=True)
 class ServerConfig:
     """Server configuration."""
     host: str = "0.0.0.0"
@@ -27,13 +67,13 @@ class ServerConfig:
     debug: bool = False
     max_content_length: int = 16 * 1024 * 1024  # 16 MB
     
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SecurityConfig:
     """Security configuration."""
-    secret_key: str = os.getenv("SECRET_KEY", "dev-key-change-in-production")
+    secret_key: str = field(default_factory=lambda: os.getenv("SECRET_KEY", "dev-key-change-in-production"))
     password_min_length: int = 8
     
-@dataclass
+@dataclass(slots=True, frozen=True)
 class APIConfig:
     """API configuration."""
     default_model: str = "gpt-4"
@@ -41,31 +81,34 @@ class APIConfig:
     default_keyword: str = "text"
     fast_api_port: int = 1336
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TelegramConfig:
     """Telegram bot configuration."""
-    bot_token: Optional[str] = os.getenv("TELEGRAM_BOT_TOKEN")
-    webhook_url: Optional[str] = os.getenv("TELEGRAM_WEBHOOK_URL")
-    use_webhook: bool = os.getenv("TELEGRAM_USE_WEBHOOK", "false").lower() == "true"
+    bot_token: Optional[str] = field(default_factory=lambda: os.getenv("TELEGRAM_BOT_TOKEN"))
+    webhook_url: Optional[str] = field(default_factory=lambda: os.getenv("TELEGRAM_WEBHOOK_URL"))
+    use_webhook: bool = field(default_factory=lambda: os.getenv("TELEGRAM_USE_WEBHOOK", "false").lower() == "true")
     
-@dataclass
+@dataclass(slots=True, frozen=True)
 class SlackConfig:
     """Slack bot configuration."""
-    bot_token: Optional[str] = os.getenv("SLACK_BOT_TOKEN")
-    app_token: Optional[str] = os.getenv("SLACK_APP_TOKEN")
+    bot_token: Optional[str] = field(default_factory=lambda: os.getenv("SLACK_BOT_TOKEN"))
+    app_token: Optional[str] = field(default_factory=lambda: os.getenv("SLACK_APP_TOKEN"))
 
     
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FileConfig:
     """File configuration."""
     upload_folder: str = str(DATA_DIR)
     cookies_file: str = str(DATA_DIR / "cookies.json")
     proxies_file: str = str(DATA_DIR / "proxies.json")
-    allowed_extensions: set = None
+    allowed_extensions: frozenset[str] = field(default_factory=lambda: frozenset({'json'}))
     
     def __post_init__(self):
-        if self.allowed_extensions is None:
-            self.allowed_extensions = {'json'}
+        _ensure_data_dir()
+    
+    def is_allowed(self, filename: str) -> bool:
+        """Check whether a filename has an allowed extension."""
+        return get_file_extension(filename) in self.allowed_extensions
 
 class Config:
     """Main configuration class."""
@@ -84,39 +127,38 @@ class Config:
         
     def _load_env_overrides(self):
         """Load configuration from environment variables."""
+        # Section configs are frozen, so overrides swap in updated copies
         # Server config
+        server_overrides: Dict[str, Any] = {}
         if os.getenv("PORT"):
-            self.server.port = int(os.getenv("PORT"))
+            server_overrides["port"] = int(os.getenv("PORT"))
         if os.getenv("DEBUG"):
-            self.server.debug = os.getenv("DEBUG").lower() == "true"
+            server_overrides["debug"] = os.getenv("DEBUG").lower() == "true"
+        if server_overrides:
+            self.server = replace(self.server, **server_overrides)
             
         # API config
+        api_overrides: Dict[str, Any] = {}
         if os.getenv("DEFAULT_MODEL"):
-            self.api.default_model = os.getenv("DEFAULT_MODEL")
+            api_overrides["default_model"] = os.getenv("DEFAULT_MODEL")
         if os.getenv("DEFAULT_PROVIDER"):
-            self.api.default_provider = os.getenv("DEFAULT_PROVIDER")
+            api_overrides["default_provider"] = os.getenv("DEFAULT_PROVIDER")
+        if api_overrides:
+            self.api = replace(self.api, **api_overrides)
             
     @property
-    def available_providers(self) -> Dict[str, Any]:
-        """Get available providers."""
-        import g4f
-        return {
-            "Auto": "",
-            **{
-                provider: getattr(g4f.Provider, provider)
-                for provider in [
-                    "ARTA", "Blackbox", "Cloudflare", "Copilot", "DeepInfra", 
-                    "DuckDuckGo", "LambdaChat", "PerplexityLabs", "PollinationsAI", 
-                    "TeachAnything", "Together", "WeWordle", "Yqcloud"
-                ]
-                if hasattr(g4f.Provider, provider)
-            }
-        }
+    def available_providers(self) -> Mapping[str, Any]:
+        """Get available providers (shared read-only mapping)."""
+        if AVAILABLE_PROVIDERS is None:
+            raise ImportError("g4f is not available") from _G4F_IMPORT_ERROR
+        return AVAILABLE_PROVIDERS
     
     @property
-    def generic_models(self) -> list:
+    def generic_models(self) -> tuple:
         """Get generic models."""
-        return ["gpt-4", "gpt-4o", "gpt-4o-mini"]
+        return GENERIC_MODELS
 
-# Global config instance
-config = Config()
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    """Get the global config instance, reading the environment on first call."""
+    return Config()
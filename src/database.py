@@ -10,12 +10,14 @@ from uuid import uuid4
 
 from werkzeug.security import generate_password_hash, check_password_hash
 
-from config import config
+from config import get_config
 from utils.exceptions import DatabaseError, ValidationError
 from utils.logging import logger
 from utils.validation import validate_username, validate_password
 from utils.helpers import generate_uuid
 
+config = get_config()
+
 @dataclass
 class UserSettings:
     """User settings data model."""
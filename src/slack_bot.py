@@ -4,30 +4,52 @@ Listens for messages and replies using ai_service.generate_response.
 """
 
 import asyncio
-import threading
+import importlib.util
+from functools import lru_cache
 from typing import Optional
 
 from utils.logging import logger
-from config import config
+from utils.asyncrun import get_running_loop_or_none, run_in_background_loop
+from config import get_config
 from ai_service import ai_service
 from database import db_manager
-
-try:
-    from slack_bolt.app.async_app import AsyncApp
-    from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
-except ImportError as e:
+from utils.exceptions import ValidationError
+
+# Skip the import attempt entirely when the package is absent
+_slack_import_error: Optional[str] = (
+    None if importlib.util.find_spec("slack_bolt") is not None
+    else "slack_bolt is not installed"
+)
+if _slack_import_error is None:
+    try:
+        from slack_bolt.app.async_app import AsyncApp
+        from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+    except ImportError as e:
+        # Installed but unusable (e.g. missing async extras)
+        _slack_import_error = str(e)
+if _slack_import_error is not None:
     # Defer import errors until actually starting the bot
-    logger.debug(f"slack import not ready: {e}")
+    logger.debug(f"slack import not ready: {_slack_import_error}")
     AsyncApp = object  # type: ignore
     AsyncSocketModeHandler = object  # type: ignore
 
 
-async def _generate_answer(text: str, user_id: str) -> str:
-    try:
-        # Map Slack user ID to a virtual user
-        username = f"slack_{user_id}"
-        
-        # Ensure a user exists for per-user history; if not, create one
+SLACK_USERNAME_PREFIX = "slack_"
+
+# Virtual usernames already known to exist in the database
+_known_users: set[str] = set()
+
+
+@lru_cache(maxsize=4096)
+def _slack_username(user_id: str) -> str:
+    # Map Slack user ID to a virtual user
+    return f"{SLACK_USERNAME_PREFIX}{user_id}"
+
+
+def _ensure_virtual_user(username: str) -> str:
+    """Make sure the virtual user exists; returns the username to answer as."""
+    # Ensure a user exists for per-user history; if not, create one
+    if username not in _known_users:
         user = db_manager.get_user_by_username(username)
         if not user:
             try:
@@ -35,32 +57,68 @@ async def _generate_answer(text: str, user_id: str) -> str:
                 logger.info(f"Created new Slack virtual user '{username}'")
             except Exception as create_err:
                 logger.warning(f"Could not create Slack user '{username}': {create_err}. Falling back to admin context.")
-                username = "admin"
-
-        reply = await ai_service.generate_response(
-            message=text,
-            username=username,
-            use_history=True,
-            remove_sources=True,
-            use_proxies=False,
-            cookie_file=config.files.cookies_file,
-        )
-        return reply
+                return "admin"
+        _known_users.add(username)
+    return username
+
+
+async def _generate_answer(text: str, user_id: str) -> str:
+    username = _slack_username(user_id)
+    try:
+        for attempt in range(2):
+            try:
+                return await ai_service.generate_response(
+                    message=text,
+                    username=_ensure_virtual_user(username),
+                    use_history=True,
+                    remove_sources=True,
+                    use_proxies=False,
+                    cookie_file=get_config().files.cookies_file,
+                )
+            except ValidationError:
+                # The cached user was deleted or renamed meanwhile; look it up again once
+                if attempt:
+                    raise
+                _known_users.discard(username)
     except Exception as e:
+        _known_users.discard(username)
         logger.error(f"Slack bot failed to get AI response: {e}")
         return "Sorry, I couldn't get a response right now. Please try again."
 
 
+async def _slack_handle_message(message, say) -> None:
+    text = message.get("text", "")
+    user_id = message.get("user", "unknown")
+
+    if not text.strip():
+        return
+
+    reply = await _generate_answer(text, user_id)
+    await say(reply)
+
+
+def _register_handlers(app: AsyncApp) -> None:
+    app.message()(_slack_handle_message)
+
+
 async def _run_slack_bot(app: AsyncApp, app_token: str) -> None:
     handler = AsyncSocketModeHandler(app, app_token)
     await handler.start_async()
 
 
+async def _slack_runner(bot_token: str, app_token: str) -> None:
+    # Create App INSIDE the running loop
+    app = AsyncApp(token=bot_token)
+    _register_handlers(app)
+    await _run_slack_bot(app, app_token)
+
+
 def start_slack_bot(blocking: bool = False, bot_token_override: Optional[str] = None, app_token_override: Optional[str] = None) -> Optional[asyncio.Future]:
     """Start the Slack bot if tokens are configured.
 
     If blocking is False, schedules in current event loop and returns the Task.
     """
+    config = get_config()
     bot_token = bot_token_override or config.slack.bot_token
     app_token = app_token_override or config.slack.app_token
     
@@ -68,80 +126,27 @@ def start_slack_bot(blocking: bool = False, bot_token_override: Optional[str] =
         logger.info("SLACK_BOT_TOKEN or SLACK_APP_TOKEN not set; Slack bot disabled")
         return None
 
-    # Logic to handle message processing - define here to share if needed, 
-    # but for Bolt, we typically attach decorators to the 'app' instance.
-    # Since we need to create 'app' inside the loop for the thread case,
-    # we'll define a factory or just duplicate the setup slightly.
-
-    async def _setup_and_run(app_instance: AsyncApp, token: str):
-        handler = AsyncSocketModeHandler(app_instance, token)
-        await handler.start_async()
-
-    def _register_handlers(app_instance: AsyncApp):
-        @app_instance.message()
-        async def handle_message(message, say):
-            text = message.get("text", "")
-            user_id = message.get("user", "unknown")
-            
-            if not text.strip():
-                return
-            
-            reply = await _generate_answer(text, user_id)
-            await say(reply)
-
     try:
         # Attempt to use an existing running loop
-        try:
-            loop = asyncio.get_running_loop()
-            
-            # We are in an async context (e.g. main thread loop)
-            # Safe to create app here
-            logger.info("Starting Slack bot in current loop")
-            app = AsyncApp(token=bot_token)
-            _register_handlers(app)
-            
-            task = loop.create_task(_setup_and_run(app, app_token))
-            
-            if blocking:
-                loop.run_until_complete(task)
-            return task
-            
-        except RuntimeError:
+        loop = get_running_loop_or_none()
+        if loop is None:
             # No running event loop in this thread; fall back to a dedicated background thread
-            def _thread_target():
-                try:
-                    # Create a dedicated event loop for this thread
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-
-                    logger.info("Starting Slack bot with Socket Mode in background thread...")
-                    
-                    async def runner():
-                        # Create App INSIDE the running loop
-                        app = AsyncApp(token=bot_token)
-                        _register_handlers(app)
-                        
-                        handler = AsyncSocketModeHandler(app, app_token)
-                        await handler.start_async()
-
-                    # Run the runner coroutine until completion (it runs forever)
-                    loop.run_until_complete(runner())
-                except Exception as exc:
-                    logger.error(f"Slack bot thread failed: {exc}")
-                finally:
-                    try:
-                        loop.close()
-                    except Exception:
-                        pass
-
-            t = threading.Thread(target=_thread_target, name="slack-bot", daemon=True)
-            t.start()
+            logger.info("Starting Slack bot with Socket Mode in background thread...")
+            run_in_background_loop(lambda: _slack_runner(bot_token, app_token), name="slack-bot")
             logger.info("Slack bot started in background thread")
             return None
 
-    except Exception as e:
-        logger.error(f"Failed to initialize Slack bot: {e}")
-        return None
+        # We are in an async context (e.g. main thread loop)
+        # Safe to create app here
+        logger.info("Starting Slack bot in current loop")
+        app = AsyncApp(token=bot_token)
+        _register_handlers(app)
+        
+        task = loop.create_task(_run_slack_bot(app, app_token))
+        
+        if blocking:
+            loop.run_until_complete(task)
+        return task
 
     except Exception as e:
         logger.error(f"Failed to initialize Slack bot: {e}")
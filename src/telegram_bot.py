@@ -1,25 +1,39 @@
 """Telegram bot integration for FreeGPT4-WEB-API.
 
-Listens for messages and replies using ai_service.generate_response.
+Listens for messages and streams replies using ai_service.stream_response.
 """
 
+from __future__ import annotations
+
 import asyncio
-import threading
-from typing import Optional
+import importlib.util
+from functools import lru_cache
+from typing import AsyncIterator, Optional
 
 from utils.logging import logger
-from config import config
+from utils.asyncrun import get_running_loop_or_none, run_in_background_loop
+from config import get_config
 from ai_service import ai_service
 from database import db_manager
-
-try:
-    from telegram import Update
-    from telegram.constants import ParseMode, ChatAction
-    from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
-    from telegram.error import BadRequest
-except Exception as e:
+from utils.exceptions import ValidationError
+
+# Skip the import attempt entirely when the package is absent
+_telegram_import_error: Optional[str] = (
+    None if importlib.util.find_spec("telegram") is not None
+    else "python-telegram-bot is not installed"
+)
+if _telegram_import_error is None:
+    try:
+        from telegram import Update
+        from telegram.constants import ParseMode, ChatAction
+        from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
+        from telegram.error import BadRequest
+    except Exception as e:
+        # Installed but unusable (e.g. incompatible version)
+        _telegram_import_error = str(e)
+if _telegram_import_error is not None:
     # Defer import errors until actually starting the bot
-    logger.debug(f"telegram import not ready: {e}")
+    logger.debug(f"telegram import not ready: {_telegram_import_error}")
     Update = object  # type: ignore
     Application = object  # type: ignore
     CommandHandler = object  # type: ignore
@@ -29,33 +43,64 @@ except Exception as e:
 
 
 TELEGRAM_USERNAME_PREFIX = "tg_"
+# Telegram caps messages at 4096 chars; keep some headroom
+_TG_MAX_LEN = 4000
+# Telegram shows a chat action for ~5s; refresh it a little earlier
+_TYPING_INTERVAL = 4.0
+# Streamed replies are sent in paragraphs of at least this many chars...
+_STREAM_MIN_FLUSH_LEN = 300
+# ...or as soon as this much text is buffered
+_STREAM_FLUSH_LEN = 3500
+
+# Virtual usernames already known to exist in the database
+_known_users: set[str] = set()
+
+
+@lru_cache(maxsize=4096)
+def _tg_username(user_id: int) -> str:
+    return f"{TELEGRAM_USERNAME_PREFIX}{user_id}"
 
 
-def _split_message(text: str, max_len: int = 4000) -> list[str]:
+def _split_message(text: str, max_len: int = _TG_MAX_LEN) -> list[str]:
+    # Fast path: nothing to send, or the usual single-message reply
+    if not text:
+        return []
     if len(text) <= max_len:
         return [text]
     parts: list[str] = []
-    # Prefer splitting on double newlines, then single newlines, then hard cut
-    remaining = text
-    while remaining:
-        if len(remaining) <= max_len:
-            parts.append(remaining)
+    append = parts.append
+    # Prefer splitting on double newlines, then single newlines, then hard cut.
+    # Scan the original string with a cursor instead of slicing off the remainder.
+    start = 0
+    length = len(text)
+    while start < length:
+        if length - start <= max_len:
+            append(text[start:])
             break
-        # Find best split point within max_len
-        window = remaining[:max_len]
-        split_idx = window.rfind("\n\n")
-        if split_idx == -1:
-            split_idx = window.rfind("\n")
-        if split_idx == -1:
-            split_idx = max_len
-        parts.append(remaining[:split_idx])
-        remaining = remaining[split_idx:].lstrip("\n")
+        # Find best split point within max_len in a single backward pass:
+        # the last newline is the fallback, the last paragraph break wins
+        end = start + max_len
+        split_idx = end
+        newline_idx = text.rfind("\n", start, end)
+        if newline_idx != -1:
+            split_idx = newline_idx
+            while newline_idx > start:
+                if text[newline_idx - 1] == "\n":
+                    split_idx = newline_idx - 1
+                    break
+                newline_idx = text.rfind("\n", start, newline_idx - 1)
+        append(text[start:split_idx])
+        # Skip the newlines at the split point
+        start = split_idx
+        while start < length and text[start] == "\n":
+            start += 1
     return parts
 
 
-async def _generate_answer(text: str, username: str) -> str:
-    try:
-        # Ensure a user exists for per-user history; if not, create one
+def _ensure_virtual_user(username: str) -> str:
+    """Make sure the virtual user exists; returns the username to answer as."""
+    # Ensure a user exists for per-user history; if not, create one
+    if username not in _known_users:
         user = db_manager.get_user_by_username(username)
         if not user:
             try:
@@ -63,20 +108,53 @@ async def _generate_answer(text: str, username: str) -> str:
                 logger.info(f"Created new Telegram virtual user '{username}'")
             except Exception as create_err:
                 logger.warning(f"Could not create Telegram user '{username}': {create_err}. Falling back to admin context.")
-                username = "admin"
-
-        reply = await ai_service.generate_response(
-            message=text,
-            username=username,
-            use_history=True,
-            remove_sources=True,
-            use_proxies=False,
-            cookie_file=config.files.cookies_file,
-        )
-        return reply
+                return "admin"
+        _known_users.add(username)
+    return username
+
+
+async def _stream_answer(text: str, username: str) -> AsyncIterator[str]:
+    answered = False
+    try:
+        for attempt in range(2):
+            answer_as = _ensure_virtual_user(username)
+            try:
+                async for segment in ai_service.stream_response(
+                    message=text,
+                    username=answer_as,
+                    use_history=True,
+                    remove_sources=True,
+                    use_proxies=False,
+                    cookie_file=get_config().files.cookies_file,
+                ):
+                    answered = True
+                    yield segment
+                return
+            except ValidationError:
+                # The cached user was deleted or renamed meanwhile; look it up again once
+                if answered or attempt:
+                    raise
+                _known_users.discard(username)
     except Exception as e:
+        _known_users.discard(username)
         logger.error(f"Telegram bot failed to get AI response: {e}")
-        return "Sorry, I couldn't get a response right now. Please try again."
+        if not answered:
+            yield "Sorry, I couldn't get a response right now. Please try again."
+
+
+def _take_ready_text(buffer: str) -> tuple[str, str]:
+    """Split streamed text into a part ready to send and the rest to keep buffering."""
+    # Send whole paragraphs, but don't spam tiny messages
+    cut = buffer.rfind("\n\n")
+    # Never cut inside an open code fence, or both halves lose their Markdown
+    while cut >= _STREAM_MIN_FLUSH_LEN and buffer.count("```", 0, cut) % 2:
+        cut = buffer.rfind("\n\n", 0, cut)
+    if cut >= _STREAM_MIN_FLUSH_LEN:
+        return buffer[:cut], buffer[cut:].lstrip("\n")
+    fence_open = buffer.count("```") % 2
+    if len(buffer) > (_TG_MAX_LEN if fence_open else _STREAM_FLUSH_LEN):
+        return buffer, ""
+    return "", buffer
 
 
 async def start_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:  # type: ignore
@@ -97,39 +175,78 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if not text.strip():
         return
 
-    username = f"{TELEGRAM_USERNAME_PREFIX}{update.effective_user.id}"
-    # Start typing indicator loop
-    typing_task = asyncio.create_task(_typing_loop(update))
-    reply = await _generate_answer(text, username)
-    # Stop typing indicator
-    typing_task.cancel()
+    username = _tg_username(update.effective_user.id)
+    answer = _stream_answer(text, username)
+    first_segment = asyncio.ensure_future(anext(answer, ""))
+    # One typing action covers fast replies; only slow ones need the refresh loop
+    await _send_typing(update)
+    done, _ = await asyncio.wait({first_segment}, timeout=_TYPING_INTERVAL)
+    typing_task = None
+    if not done:
+        typing_task = asyncio.create_task(_typing_loop(update))
+    buffer = await first_segment
+    # Stop typing indicator once text starts arriving
+    if typing_task is not None:
+        typing_task.cancel()
+        try:
+            await typing_task
+        except Exception:
+            pass
+    # Send paragraphs while the rest of the reply is still being generated
+    markdown_ok = True
+    while True:
+        ready, buffer = _take_ready_text(buffer)
+        if ready.strip():
+            markdown_ok = await _send_reply(update, ready, markdown_ok)
+        segment = await anext(answer, None)
+        if segment is None:
+            break
+        buffer += segment
+    if buffer.strip():
+        await _send_reply(update, buffer, markdown_ok)
+
+
+async def _send_reply(update: Update, text: str, markdown_ok: bool) -> bool:  # type: ignore
+    """Send text in Telegram-sized chunks; returns whether Markdown still works."""
+    # Once Markdown is rejected for a reply, send its remaining chunks as plain text
+    for chunk in _split_message(text):
+        if markdown_ok:
+            try:
+                await update.message.reply_text(chunk, parse_mode=ParseMode.MARKDOWN)
+                continue
+            except BadRequest:
+                # Likely formatting or length issue; retry without markdown
+                markdown_ok = False
+        await update.message.reply_text(chunk)
+    return markdown_ok
+
+
+async def _send_typing(update: Update) -> None:  # type: ignore
     try:
-        await typing_task
+        if update.effective_chat is not None:
+            await update.effective_chat.send_action(ChatAction.TYPING)
     except Exception:
         pass
-    chunks = _split_message(reply)
-    for idx, chunk in enumerate(chunks):
-        try:
-            await update.message.reply_text(chunk, parse_mode=ParseMode.MARKDOWN)
-        except BadRequest:
-            # Likely formatting or length issue; retry without markdown
-            await update.message.reply_text(chunk)
 
 
 async def _typing_loop(update: Update) -> None:  # type: ignore
     try:
         while True:
-            try:
-                if update.effective_chat is not None:
-                    await update.effective_chat.send_action(ChatAction.TYPING)
-            except Exception:
-                pass
-            await asyncio.sleep(4.0)
+            await _send_typing(update)
+            await asyncio.sleep(_TYPING_INTERVAL)
     except asyncio.CancelledError:
         # Exit quietly when cancelled
         return
 
 
+def _build_application(token: str) -> Application:  # type: ignore
+    application = Application.builder().token(token).build()  # type: ignore
+    application.add_handler(CommandHandler("start", start_cmd))  # type: ignore
+    application.add_handler(CommandHandler("help", help_cmd))  # type: ignore
+    application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))  # type: ignore
+    return application
+
+
 async def _run_polling(application: Application) -> None:  # type: ignore
     await application.initialize()
     await application.start()
@@ -146,60 +263,34 @@ def start_telegram_bot(blocking: bool = False, token_override: Optional[str] = N
 
     If blocking is False, schedules in current event loop and returns the Task.
     """
+    config = get_config()
     token = token_override or config.telegram.bot_token
     if not token:
         logger.info("TELEGRAM_BOT_TOKEN not set; Telegram bot disabled")
         return None
 
     # Attempt to use an existing running loop; if none, start a background thread with run_polling
-    try:
-        loop = asyncio.get_running_loop()
-        # Build handlers in this loop context
-        application = Application.builder().token(token).build()  # type: ignore
-        application.add_handler(CommandHandler("start", start_cmd))  # type: ignore
-        application.add_handler(CommandHandler("help", help_cmd))  # type: ignore
-        application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))  # type: ignore
-
-        # Webhook mode support (optional)
-        if config.telegram.use_webhook and config.telegram.webhook_url:
-            async def run_webhook():
-                await application.initialize()
-                await application.bot.set_webhook(config.telegram.webhook_url)
-                await application.start()
-                logger.info("Telegram bot webhook started")
-            return loop.create_task(run_webhook())
-
-        # Polling mode (default)
-        task = loop.create_task(_run_polling(application))
-        if blocking:
-            loop.run_until_complete(task)
-        return task
-    except RuntimeError:
+    loop = get_running_loop_or_none()
+    if loop is None:
         # No running event loop in this thread; fall back to a dedicated background thread
-        def _thread_target():
-            try:
-                # Create a dedicated event loop for this thread
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-
-                app = Application.builder().token(token).build()  # type: ignore
-                app.add_handler(CommandHandler("start", start_cmd))  # type: ignore
-                app.add_handler(CommandHandler("help", help_cmd))  # type: ignore
-                app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))  # type: ignore
-
-                # Run the same polling coroutine used elsewhere
-                loop.run_until_complete(_run_polling(app))
-            except Exception as exc:
-                logger.error(f"Telegram bot thread failed: {exc}")
-            finally:
-                try:
-                    loop.close()
-                except Exception:
-                    pass
-
-        t = threading.Thread(target=_thread_target, name="telegram-bot", daemon=True)
-        t.start()
+        run_in_background_loop(lambda: _run_polling(_build_application(token)), name="telegram-bot")
         logger.info("Telegram bot polling started in background thread")
         return None
 
-
+    # Build handlers in this loop context
+    application = _build_application(token)
+
+    # Webhook mode support (optional)
+    if config.telegram.use_webhook and config.telegram.webhook_url:
+        async def run_webhook():
+            await application.initialize()
+            await application.bot.set_webhook(config.telegram.webhook_url)
+            await application.start()
+            logger.info("Telegram bot webhook started")
+        return loop.create_task(run_webhook())
+
+    # Polling mode (default)
+    task = loop.create_task(_run_polling(application))
+    if blocking:
+        loop.run_until_complete(task)
+    return task
@@ -0,0 +1,42 @@
+"""Helpers for running asyncio code in background threads."""
+
+import asyncio
+import threading
+from typing import Any, Awaitable, Callable, Optional
+
+from .logging import logger
+
+def get_running_loop_or_none() -> Optional[asyncio.AbstractEventLoop]:
+    """Get the event loop running in the current thread, if any.
+    
+    Returns:
+        The running loop or None
+    """
+    # Unlike get_running_loop(), this low-level variant returns None
+    # instead of raising RuntimeError when no loop is running
+    return asyncio._get_running_loop()
+
+def run_in_background_loop(coro_factory: Callable[[], Awaitable[Any]], name: str) -> threading.Thread:
+    """Run a coroutine in a dedicated event loop on a daemon thread.
+    
+    Args:
+        coro_factory: Callable returning the coroutine to run; it is invoked
+            inside the new thread so loop-bound objects are created there
+        name: Thread name, also used in log messages
+        
+    Returns:
+        The started thread
+    """
+    def _thread_target():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(coro_factory())
+        except Exception as exc:
+            logger.error(f"{name} thread failed: {exc}")
+        finally:
+            loop.close()
+    
+    thread = threading.Thread(target=_thread_target, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -9,6 +9,11 @@ from pathlib import Path
 
 from .logging import logger
 
+# Inline source references like [^1^][1]
+SOURCE_MARKER_PATTERN = re.compile(r"\[\^[0-9]+\^\]\[[0-9]+\]")
+# Reference list lines like "[1]: https://example.com"
+REFERENCE_LINE_PATTERN = re.compile(r"^\[[0-9]+\]: ")
+
 def generate_uuid() -> str:
     """Generate a new UUID4 string.
     
@@ -68,14 +73,58 @@ def clean_response_sources(response: str) -> str:
         return response
     
     # Remove source references like [^1^][1]
-    if re.search(r"\[\^[0-9]+\^\]\[[0-9]+\]", response):
+    if SOURCE_MARKER_PATTERN.search(response):
         response_parts = response.split("\n\n")
         if len(response_parts) > 1:
             response_parts.pop(0)  # Remove first part (usually sources)
-        response = re.sub(r"\[\^[0-9]+\^\]\[[0-9]+\]", "", str(response_parts[0]) if response_parts else "")
+        response = SOURCE_MARKER_PATTERN.sub("", str(response_parts[0]) if response_parts else "")
     
     return response.strip()
 
+def strip_source_markers(text: str) -> str:
+    """Remove inline source references from a piece of AI response.
+    
+    Unlike clean_response_sources, this works on partial (streamed) text
+    and leaves paragraphs and whitespace untouched.
+    
+    Args:
+        text: Response text fragment
+        
+    Returns:
+        Text without source references
+    """
+    return SOURCE_MARKER_PATTERN.sub("", text)
+
+def strip_reference_list(text: str) -> str:
+    """Remove a leading reference-list paragraph from AI response text.
+    
+    Streaming counterpart of the first-paragraph removal done by
+    clean_response_sources.
+    
+    Args:
+        text: Response text starting at the beginning of the reply
+        
+    Returns:
+        Text without the leading reference list
+    """
+    first, separator, rest = text.partition("\n\n")
+    lines = [line for line in first.splitlines() if line.strip()]
+    if separator and lines and all(REFERENCE_LINE_PATTERN.match(line) for line in lines):
+        return rest
+    return text
+
+def get_file_extension(filename: str) -> Optional[str]:
+    """Get the lower-cased extension of a filename.
+    
+    Args:
+        filename: File name
+        
+    Returns:
+        Extension without the dot, or None if the name has no extension
+    """
+    _, dot, extension = filename.rpartition('.')
+    return extension.lower() if dot else None
+
 def format_proxy_url(proxy_dict: Dict[str, str]) -> str:
     """Format proxy dictionary to URL string.
     
@@ -4,6 +4,8 @@ import re
 from typing import Optional, Dict, Any
 from werkzeug.datastructures import FileStorage
 
+from .helpers import get_file_extension
+
 def validate_proxy_format(proxy: str) -> bool:
     """Validate proxy format.
     
@@ -91,10 +93,10 @@ def validate_file_upload(file: FileStorage, allowed_extensions: set) -> tuple[bo
     if not file or not file.filename:
         return False, "No file provided"
     
-    if '.' not in file.filename:
+    extension = get_file_extension(file.filename)
+    if extension is None:
         return False, "File must have an extension"
     
-    extension = file.filename.rsplit('.', 1)[1].lower()
     if extension not in allowed_extensions:
         return False, f"File extension '{extension}' not allowed. Allowed: {', '.join(allowed_extensions)}"
     
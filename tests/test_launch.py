@@ -17,7 +17,7 @@ class TestBasicFunctionality:
     
     def test_python_version(self):
         """Verify Python version is acceptable."""
-        assert sys.version_info >= (3, 9)
+        assert sys.version_info >= (3, 10)
 
 
 class TestConfigModule:
@@ -35,6 +35,41 @@ class TestConfigModule:
         assert hasattr(config, 'database')
         assert hasattr(config, 'server')
         assert hasattr(config, 'security')
+    
+    def test_get_config_cached(self):
+        """Test that get_config returns a shared instance."""
+        from config import get_config, Config
+        assert isinstance(get_config(), Config)
+        assert get_config() is get_config()
+    
+    def test_config_sections_frozen(self):
+        """Test that config sections are read-only."""
+        import dataclasses
+        from config import Config
+        config = Config()
+        assert config.files.allowed_extensions == frozenset({'json'})
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            config.server.port = 1234
+    
+    def test_file_extension_check(self):
+        """Test allowed file extension check."""
+        from config import Config
+        files = Config().files
+        assert files.is_allowed("cookies.JSON")
+        assert not files.is_allowed("cookies.txt")
+        assert not files.is_allowed("json")
+    
+    def test_file_upload_validation(self):
+        """Test upload validation against the file config."""
+        from config import Config
+        from utils.validation import validate_file_upload
+        from werkzeug.datastructures import FileStorage
+        allowed = Config().files.allowed_extensions
+        assert validate_file_upload(FileStorage(filename="cookies.json"), allowed) == (True, None)
+        is_valid, error_msg = validate_file_upload(FileStorage(filename="cookies.txt"), allowed)
+        assert not is_valid and "'txt' not allowed" in error_msg
+        is_valid, error_msg = validate_file_upload(FileStorage(filename="cookies"), allowed)
+        assert not is_valid and error_msg == "File must have an extension"
 
 
 class TestDatabaseModule:
@@ -152,6 +187,309 @@ class TestUtilsModule:
         assert callable(generate_uuid)
         assert callable(load_json_file)
         assert callable(clean_response_sources)
+    
+    def test_strip_source_markers(self):
+        """Test removal of inline source references from partial text."""
+        from utils.helpers import strip_source_markers
+        assert strip_source_markers("Paris[^1^][1] is big.\n\n") == "Paris is big.\n\n"
+    
+    def test_strip_reference_list(self):
+        """Test removal of a leading reference-list paragraph."""
+        from utils.helpers import strip_reference_list
+        assert strip_reference_list("[1]: https://a.example\n\nParis") == "Paris"
+        assert strip_reference_list("Paris\n\n[1]: https://a.example") == "Paris\n\n[1]: https://a.example"
+        assert strip_reference_list("[1]: https://a.example") == "[1]: https://a.example"
+
+
+class TestAsyncRunModule:
+    """Test background event loop helper."""
+    
+    def test_run_in_background_loop(self):
+        """Test that the coroutine runs to completion in its own thread."""
+        import asyncio
+        import threading
+        from utils.asyncrun import run_in_background_loop
+        
+        result = {}
+        
+        async def job():
+            await asyncio.sleep(0)
+            result["thread"] = threading.current_thread().name
+        
+        thread = run_in_background_loop(job, name="test-loop")
+        thread.join(timeout=5)
+        assert result["thread"] == "test-loop"
+        assert thread.daemon
+    
+    def test_get_running_loop_or_none(self):
+        """Test running loop detection inside and outside a loop."""
+        import asyncio
+        from utils.asyncrun import get_running_loop_or_none
+        
+        async def inside():
+            return get_running_loop_or_none() is asyncio.get_running_loop()
+        
+        assert get_running_loop_or_none() is None
+        assert asyncio.run(inside())
+
+
+class TestTelegramBotModule:
+    """Test Telegram bot helpers."""
+    
+    def test_split_message_short(self):
+        """Test that short replies are sent as a single chunk."""
+        from telegram_bot import _split_message
+        assert _split_message("hello") == ["hello"]
+        assert _split_message("") == []
+    
+    def test_split_message_prefers_paragraphs(self):
+        """Test splitting on paragraph, line and hard boundaries."""
+        from telegram_bot import _split_message
+        assert _split_message("aaaa\n\nbb\ncc", max_len=6) == ["aaaa", "bb\ncc"]
+        assert _split_message("aaa\nbbbbb", max_len=5) == ["aaa", "bbbbb"]
+        assert _split_message("abcdefgh", max_len=3) == ["abc", "def", "gh"]
+    
+    def test_take_ready_text(self):
+        """Test buffering of streamed replies into sendable paragraphs."""
+        from telegram_bot import _take_ready_text, _STREAM_MIN_FLUSH_LEN, _STREAM_FLUSH_LEN
+        paragraph = "a" * _STREAM_MIN_FLUSH_LEN
+        assert _take_ready_text("short\n\nrest") == ("", "short\n\nrest")
+        assert _take_ready_text(paragraph + "\n\nrest") == (paragraph, "rest")
+        long_text = "b" * (_STREAM_FLUSH_LEN + 1)
+        assert _take_ready_text(long_text) == (long_text, "")
+
+
+    def test_take_ready_text_keeps_code_fences_whole(self):
+        """Test that a blank line inside an open code fence is not a cut point."""
+        from telegram_bot import _take_ready_text, _STREAM_MIN_FLUSH_LEN
+        intro = "a" * _STREAM_MIN_FLUSH_LEN
+        open_fence = intro + "\n\n```python\nx = 1\n\ny = 2\n"
+        assert _take_ready_text(open_fence) == (intro, "```python\nx = 1\n\ny = 2\n")
+        closed = open_fence + "```\n\nafter"
+        ready, rest = _take_ready_text(closed)
+        assert ready.endswith("```") and ready.count("```") == 2
+        assert rest == "after"
+    
+    def test_handle_message_uses_fallback_text(self, monkeypatch):
+        """Test that a failed answer is replaced by the apology message."""
+        import asyncio
+        import telegram_bot
+        
+        async def failing_stream(**kwargs):
+            raise RuntimeError("provider down")
+            yield  # pragma: no cover
+        
+        monkeypatch.setattr(telegram_bot, "_ensure_virtual_user", lambda username: username)
+        monkeypatch.setattr(telegram_bot.ai_service, "stream_response", failing_stream)
+        update = _FakeUpdate()
+        asyncio.run(telegram_bot.handle_message(update, None))
+        assert [text for text, _ in update.message.sent] == [
+            "Sorry, I couldn't get a response right now. Please try again."
+        ]
+    
+    def test_stream_answer_recreates_deleted_user(self, monkeypatch):
+        """Test that a cached user deleted meanwhile is re-created, not an error."""
+        import asyncio
+        import telegram_bot
+        from utils.exceptions import ValidationError
+        
+        existing = set()
+        monkeypatch.setattr(telegram_bot.db_manager, "get_user_by_username",
+                            lambda username: {"username": username} if username in existing else None)
+        monkeypatch.setattr(telegram_bot.db_manager, "create_user", existing.add)
+        
+        async def fake_stream(username, **kwargs):
+            if username not in existing:
+                raise ValidationError(f"User '{username}' not found")
+            yield "answer"
+        
+        monkeypatch.setattr(telegram_bot.ai_service, "stream_response", fake_stream)
+        # Known to the bot, but deleted by an admin in the meantime
+        monkeypatch.setattr(telegram_bot, "_known_users", {"tg_7"})
+        
+        async def collect():
+            return [segment async for segment in telegram_bot._stream_answer("hi", "tg_7")]
+        
+        assert asyncio.run(collect()) == ["answer"]
+        assert "tg_7" in existing
+    
+    def test_handle_message_stops_markdown_after_rejection(self, monkeypatch):
+        """Test that markdown_ok carries across the chunks of one reply."""
+        import asyncio
+        import telegram_bot
+        from telegram.constants import ParseMode
+        
+        paragraphs = ["*broken" + "a" * 400 + "\n\n", "b" * 400 + "\n\n", "c" * 10]
+        
+        async def fake_stream(text, username):
+            for paragraph in paragraphs:
+                yield paragraph
+        
+        monkeypatch.setattr(telegram_bot, "_stream_answer", fake_stream)
+        update = _FakeUpdate(reject_markdown=True)
+        asyncio.run(telegram_bot.handle_message(update, None))
+        # One rejected Markdown attempt, then everything as plain text
+        assert update.message.markdown_attempts == 1
+        assert update.message.sent == [
+            (paragraphs[0].rstrip("\n"), None),
+            (paragraphs[1].rstrip("\n"), None),
+            (paragraphs[2], None),
+        ]
+        assert ParseMode.MARKDOWN not in [mode for _, mode in update.message.sent]
+
+
+class _FakeMessage:
+    """Minimal stand-in for a Telegram message."""
+    
+    def __init__(self, reject_markdown=False):
+        self.text = "hello"
+        self.reject_markdown = reject_markdown
+        self.markdown_attempts = 0
+        self.sent = []
+    
+    async def reply_text(self, text, parse_mode=None):
+        from telegram.error import BadRequest
+        if parse_mode is not None:
+            self.markdown_attempts += 1
+            if self.reject_markdown:
+                raise BadRequest("Can't parse entities")
+        self.sent.append((text, parse_mode))
+
+
+class _FakeChat:
+    """Minimal stand-in for a Telegram chat."""
+    
+    async def send_action(self, action):
+        pass
+
+
+class _FakeUpdate:
+    """Minimal stand-in for a Telegram update."""
+    
+    def __init__(self, reject_markdown=False):
+        from types import SimpleNamespace
+        self.message = _FakeMessage(reject_markdown)
+        self.effective_user = SimpleNamespace(id=42)
+        self.effective_chat = _FakeChat()
+
+
+class TestAIServiceStreaming:
+    """Test streamed AI responses."""
+    
+    @staticmethod
+    def _patch_service(monkeypatch, chunks=None, error=None, fallback="full reply"):
+        from ai_service import ai_service
+        
+        saved = []
+        
+        class FakeDB:
+            def get_chat_history(self, username):
+                return None
+            
+            def save_chat_history(self, username, history):
+                saved.append((username, history))
+        
+        async def fake_stream(*args, **kwargs):
+            for chunk in chunks or []:
+                yield chunk
+            if error is not None:
+                raise error
+        
+        fallback_calls = []
+        
+        async def fake_call(**kwargs):
+            fallback_calls.append(kwargs)
+            return fallback
+        
+        monkeypatch.setattr(ai_service, "db", FakeDB())
+        monkeypatch.setattr(ai_service, "_resolve_user_settings", lambda **kwargs: {
+            "provider": "Auto",
+            "model": "gpt-4",
+            "system_prompt": "",
+            "message_history": True
+        })
+        monkeypatch.setattr(ai_service, "_stream_api_call", fake_stream)
+        monkeypatch.setattr(ai_service, "_call_ai_api", fake_call)
+        return ai_service, saved, fallback_calls
+    
+    @staticmethod
+    def _collect(service, **kwargs):
+        import asyncio
+        
+        async def collect():
+            return [segment async for segment in service.stream_response("hi", **kwargs)]
+        
+        return asyncio.run(collect())
+    
+    def test_yields_paragraphs_and_saves_history(self, monkeypatch):
+        """Test paragraph-wise yields and the saved assistant turn."""
+        import json
+        service, saved, fallback_calls = self._patch_service(
+            monkeypatch, chunks=["Hello [^1^][1]wor", "ld\n\nSecond para", "graph"]
+        )
+        assert self._collect(service) == ["Hello world\n\n", "Second paragraph"]
+        assert not fallback_calls
+        history = json.loads(saved[0][1])
+        assert history[-1] == {"role": "assistant", "content": "Hello world\n\nSecond paragraph"}
+    
+    def test_streamed_cleanup_matches_clean_response_sources(self, monkeypatch):
+        """Test that a leading reference list is dropped like in the regular path."""
+        from utils.helpers import clean_response_sources
+        reply = "[1]: https://a.example\n[2]: https://b.example\n\nParis[^1^][1] is the capital."
+        service, saved, fallback_calls = self._patch_service(
+            monkeypatch, chunks=[reply[:20], reply[20:50], reply[50:]]
+        )
+        segments = self._collect(service)
+        assert "".join(segments) == clean_response_sources(reply) == "Paris is the capital."
+    
+    def test_falls_back_when_stream_is_empty(self, monkeypatch):
+        """Test fallback to the provider chain when nothing is streamed."""
+        service, saved, fallback_calls = self._patch_service(monkeypatch, chunks=[])
+        assert self._collect(service) == ["full reply"]
+        assert len(fallback_calls) == 1
+        assert len(saved) == 1
+    
+    def test_falls_back_when_stream_fails_first(self, monkeypatch):
+        """Test fallback to the provider chain when the stream fails up front."""
+        service, saved, fallback_calls = self._patch_service(monkeypatch, error=RuntimeError("boom"))
+        assert self._collect(service) == ["full reply"]
+        assert len(fallback_calls) == 1
+    
+    def test_stream_not_supported_is_not_a_health_failure(self, monkeypatch):
+        """Test that providers without streaming are not marked as failing."""
+        from g4f.errors import StreamNotSupportedError
+        from utils.provider_monitor import provider_monitor
+        service, saved, fallback_calls = self._patch_service(
+            monkeypatch, error=StreamNotSupportedError("no streaming")
+        )
+        failures = provider_monitor.get_provider_health("Auto").consecutive_failures
+        assert self._collect(service) == ["full reply"]
+        assert provider_monitor.get_provider_health("Auto").consecutive_failures == failures
+    
+    def test_should_skip_repeatedly_failing_provider(self, monkeypatch):
+        """Test that streaming and the regular path share the provider skip rule."""
+        from ai_service import ai_service
+        from utils.provider_monitor import ProviderMonitor
+        import ai_service as ai_service_module
+        
+        monitor = ProviderMonitor()
+        monkeypatch.setattr(ai_service_module, "provider_monitor", monitor)
+        assert not ai_service._should_skip_provider("Auto")
+        assert not ai_service._should_skip_provider("Flaky")
+        monitor.get_provider_health("Flaky").consecutive_failures = 2
+        assert ai_service._should_skip_provider("Flaky")
+    
+    def test_interrupted_stream_is_flagged_and_not_saved(self, monkeypatch):
+        """Test that a stream cut off mid-reply is flagged and kept out of history."""
+        from ai_service import STREAM_INTERRUPTED_NOTICE
+        service, saved, fallback_calls = self._patch_service(
+            monkeypatch, chunks=["First\n\n", "Sec"], error=RuntimeError("boom")
+        )
+        segments = self._collect(service)
+        assert segments[:2] == ["First\n\n", "Sec"]
+        assert segments[-1].strip() == STREAM_INTERRUPTED_NOTICE
+        assert not fallback_calls
+        assert not saved
 
 
 class TestIntegration: